@@ -1,11 +1,9 @@
 import json
 import os
-import struct
 from typing import Self
 
 from BinaryDataDecoder.data_finder import BinaryDataFinder
-from BinaryDataDecoder.helper import ENDIAN
-from BinaryDataDecoder.utils import RESULT_DIR, find_unused_2byte_pair
+from BinaryDataDecoder.utils import result_path, find_unused_2byte_pair
 
 
 class DataExtractor:
@@ -14,11 +12,11 @@ class DataExtractor:
 
     @property
     def results(self) -> list:
-        return self._bdf.read().results
+        return self._bdf.results
 
     def write_output(self, out_path: str = None):
         if out_path is None:
-            out_path = os.path.join(RESULT_DIR, 'report_with_values.json')
+            out_path = result_path('report_with_values.json')
 
         with open(out_path, 'w') as report:
             report_obj = {'results': [x.__dict__() for x in self.results]}
@@ -27,12 +25,11 @@ class DataExtractor:
     def write_bin_leftovers(self, out_path: str = None) -> str:
         if out_path is None:
             fn = os.path.basename(self._bdf.fp) + '_leftovers.bin'
-            out_path = os.path.join(RESULT_DIR, fn)
+            out_path = result_path(fn)
 
         with open(out_path, 'wb+') as report:
             content_chunks = self._bdf.bin_file_contents
-            offset = 0
-            for content in content_chunks:
+            for content, offset in zip(content_chunks, self._bdf.bin_file_content_offsets):
                 replacement = find_unused_2byte_pair(content)
                 content_array = bytearray(content)
                 for res in self.results:
@@ -42,7 +39,6 @@ class DataExtractor:
                         if end >= 0 and start < len(content_array):
                             start = max(0, start)
                             content_array[start:end] = replacement * int(res.data_type.length_in_byte // 2)
-                offset += len(content_array)
                 content_array = content_array.replace(replacement, b'')
                 report.write(content_array)
 
@@ -54,11 +50,5 @@ class DataExtractor:
 
     def extract_values(self) -> Self:
         for res in self.results:
-            values_as_byts = b''
-            for i in res.streak:
-                values_as_byts += self._bdf.get_element_at_pos(i, res.data_type)
-            data_type = res.data_type
-            endian_char = '>' if res.endian == ENDIAN.BIG_ENDIAN else '<'
-            number_of_results = len(res.streak)
-            res.values = struct.unpack(f'{endian_char}{number_of_results}{data_type.formatter_char}', values_as_byts)
+            res.values = tuple(self._bdf.values_at(res.streak, res.endian, res.data_type).tolist())
         return self
@@ -39,6 +39,10 @@ class DataTypeMetaData:
             return self._parse_byte_stream_test_seq_little(chunk_to_test)
         return self._parse_byte_stream_test_seq_big(chunk_to_test)
 
+    def test_seq_bits(self, values):
+        """Bits compared by the step check of already decoded (unsigned) values, e.g. a numpy array"""
+        return (values & self.endian_bitmask) >> self._right_shift
+
     def _parse_byte_stream_test_seq_big(self, chunk_to_test: bytes):
         bin_to_test = int.from_bytes(chunk_to_test, 'big')
         return (bin_to_test & self.endian_bitmask) >> self._right_shift
@@ -42,5 +42,10 @@ class Hexdump:
         if os.path.exists(output_filename):
             os.remove(output_filename)
         with open(output_filename, 'w+') as f:
-            for index, line in enumerate(lines):
-                f.write(f"{(index * len(line) + offset):08x} {cls._encode_hex(line)} : {cls._decode_bytes(line)}\n")
\ No newline at end of file
+            for dump_line in cls.dump_lines(lines, offset):
+                f.write(f"{dump_line}\n")
+
+    @classmethod
+    def dump_lines(cls, lines: list[bytes], offset: int = 0) -> list[str]:
+        return [f"{(index * len(line) + offset):08x} {cls._encode_hex(line)} : {cls._decode_bytes(line)}"
+                for index, line in enumerate(lines)]
\ No newline at end of file
@@ -0,0 +1,186 @@
+import argparse
+import copy
+import ipaddress
+import json
+import multiprocessing
+import os.path
+import socket
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from BinaryDataDecoder.data_finder import BinaryDataFinder
+from BinaryDataDecoder.extract_data import DataExtractor
+from BinaryDataDecoder.helper import DATA_TYPE, FoundDataInfo
+from BinaryDataDecoder.hexdump import Hexdump
+from BinaryDataDecoder.utils import open_as_binary, bytes_as_binary_lines
+
+FINDER_ARGS = ('min_length_data', 'number_of_threads', 'value_in_row', 'decrease_accuracy', 'offset', 'length')
+MAX_CACHED_FINDERS = 16
+
+# Per worker process: finders which already read their file (and found their results)
+_finders: OrderedDict[tuple, BinaryDataFinder] = OrderedDict()
+
+
+def _init_worker():
+    # The workers report through the return values, the scan progress output is not needed
+    sys.stdout = open(os.devnull, 'w')
+
+
+def _warm_up():
+    # Importing this module in the worker loads the finder and numpy before the first request
+    return os.getpid()
+
+
+def _is_loopback(host: str) -> bool:
+    try:
+        addresses = socket.getaddrinfo(host, None)
+    except socket.gaierror:
+        return False
+    return all(ipaddress.ip_address(address[4][0]).is_loopback for address in addresses)
+
+
+def _file_key(request: dict) -> tuple:
+    stat = os.stat(request['file_path'])
+    return (os.path.abspath(request['file_path']), stat.st_mtime_ns, stat.st_size)
+
+
+def _get_finder(request: dict) -> BinaryDataFinder:
+    data_types = request.get('data_types')
+    key = (_file_key(request), tuple(data_types or ()),
+           tuple((arg, request[arg]) for arg in FINDER_ARGS if arg in request))
+    if key in _finders:
+        _finders.move_to_end(key)
+        return _finders[key]
+
+    bdf = BinaryDataFinder(request['file_path'], **{arg: request[arg] for arg in FINDER_ARGS if arg in request})
+    bdf.read().find_data(data_types=None if data_types is None else [DATA_TYPE[d] for d in data_types])
+    _finders[key] = bdf
+    if len(_finders) > MAX_CACHED_FINDERS:
+        _finders.popitem(last=False)
+    return bdf
+
+
+def scan(request: dict) -> dict:
+    return {'results': [x.__dict__() for x in _get_finder(request).results]}
+
+
+def _copy_result(res: FoundDataInfo) -> FoundDataInfo:
+    res_copy = FoundDataInfo(res.offset, res.bytes_step, res.data_type, res.endian, res.quality_index)
+    res_copy.streak = res.streak
+    return res_copy
+
+
+def extract(request: dict) -> dict:
+    # The cached finder is shared with later scans, the values are only added to copies of its results
+    bdf = copy.copy(_get_finder(request))
+    bdf.results = [_copy_result(res) for res in bdf.results]
+    DataExtractor(bdf).extract_values()
+    return {'results': [x.__dict__() for x in bdf.results]}
+
+
+def hexdump(request: dict) -> dict:
+    offset = request.get('offset', 0)
+    content = open_as_binary(request['file_path'], offset, request.get('length', -1))
+    return {'lines': Hexdump.dump_lines(bytes_as_binary_lines(content, request.get('n_bytes', 16)), offset)}
+
+
+COMMANDS = {'scan': scan, 'extract': extract, 'hexdump': hexdump}
+
+
+class DecodeServer(ThreadingHTTPServer):
+    """
+    Local HTTP server answering scan, extract and hexdump requests.
+    The work is done by a pool of warm worker processes, answers are cached as long as the file does not change.
+    The requests read any file the server can read, so the server only listens on loopback addresses.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], number_of_workers: int | None = None, cache_size: int = 256):
+        if not _is_loopback(address[0]):
+            raise ValueError(f'The decode server only listens on loopback addresses, not on {address[0]}')
+        super().__init__(address, DecodeRequestHandler)
+        # The workers are not forked from the request handler threads of this process
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        number_of_workers = number_of_workers or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(number_of_workers, mp_context=multiprocessing.get_context(start_method),
+                                         initializer=_init_worker)
+        # One task per worker starts all of them now instead of at the first requests
+        for future in [self._pool.submit(_warm_up) for _ in range(number_of_workers)]:
+            future.result()
+        self._cache: OrderedDict[str, dict] = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.RLock()
+
+    def handle_command(self, command: str, request: dict) -> dict:
+        key = json.dumps([command, _file_key(request), request], sort_keys=True)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        response = self._pool.submit(COMMANDS[command], request).result()
+        with self._lock:
+            self._cache[key] = response
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return response
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(cancel_futures=True)
+
+
+class DecodeRequestHandler(BaseHTTPRequestHandler):
+    server: DecodeServer
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, {'status': 'ok'})
+        else:
+            self._send(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        command = self.path.strip('/')
+        if command not in COMMANDS:
+            self._send(404, {'error': f'Unknown command {command}'})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            self._send(200, self.server.handle_command(command, request))
+        except Exception as e:
+            self._send(400, {'error': f'{type(e).__name__}: {e}'})
+
+    def _send(self, status: int, body: dict):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog='BinaryDataDecoder.server',
+                                     description='Runs a local decode server with warm worker processes')
+    parser.add_argument('--host', default='127.0.0.1', help='Loopback address to listen on')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache-size', type=int, default=256)
+    args = parser.parse_args(argv)
+
+    with DecodeServer((args.host, args.port), args.workers, args.cache_size) as server:
+        print(f'Serving on http://{args.host}:{server.server_port}', flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import json
+import math
+import os.path
+import subprocess
+import sys
+import tempfile
+from typing import Self
+
+from BinaryDataDecoder.data_finder import BinaryDataFinder
+from BinaryDataDecoder.helper import FoundDataInfo, DATA_TYPE
+from BinaryDataDecoder.utils import result_path
+
+DEFAULT_MARGIN = 1024
+
+
+def shard_ranges(file_size: int, number_of_shards: int) -> list[tuple[int, int]]:
+    shard_size = math.ceil(file_size / number_of_shards)
+    return [(start, min(file_size, start + shard_size)) for start in range(0, file_size, shard_size)]
+
+
+class ShardFinder(BinaryDataFinder):
+    """
+    Scans the read window of a shard, but validates every streak over the whole file like a single scan does.
+    Only the spans of the streaks which reach the border of the read window are read from the file.
+    """
+
+    def __init__(self, file_path: str, file_size: int, **finder_kwargs):
+        super().__init__(file_path, quality_size=file_size, **finder_kwargs)
+        self._file_size = file_size
+
+    def read(self) -> Self:
+        super().read()
+        # The streaks of a shard can span the file up to its end
+        self._total_size = self._file_size - self._read_offset
+        return self
+
+    def _validate_whole_streak(self, finding: FoundDataInfo):
+        super()._validate_whole_streak(finding)
+        window_stop = self._read_offset + len(self._content)
+        cut_start = self._read_offset > 0 and finding.streak.start - finding.streak.step < 0
+        cut_stop = window_stop < self._file_size and finding.streak.stop + finding.data_type.length_in_byte > len(
+            self._content)
+        if cut_start or cut_stop:
+            finding.streak = range(finding.streak.start + self._read_offset, finding.streak.stop + self._read_offset,
+                                   finding.streak.step)
+            validate_in_file(self._fp, finding, self._file_size)
+            finding.streak = range(finding.streak.start - self._read_offset, finding.streak.stop - self._read_offset,
+                                   finding.streak.step)
+
+
+def validate_in_file(file_path: str, res: FoundDataInfo, file_size: int):
+    """
+    Extends and validates a streak in the whole file. Only the span of the streak is read,
+    it is doubled as long as the streak reaches its border.
+    """
+    length = res.data_type.length_in_byte
+    start, stop = res.streak.start, min(file_size, max(res.streak.stop, res.streak.start + length))
+    offset = res.offset
+    while True:
+        bdf = BinaryDataFinder(file_path, number_of_threads=1, regions=[(start, stop)], quality_size=file_size).read()
+        res.streak = range(offset, offset, res.streak.step)
+        bdf._validate_whole_streak(res)
+        grow_start = start > 0 and res.streak.start - res.streak.step < start
+        grow_stop = stop < file_size and res.streak.stop + length > stop
+        if not (grow_start or grow_stop):
+            return
+        size = stop - start
+        if grow_start:
+            start = max(0, start - size)
+        if grow_stop:
+            stop = min(file_size, stop + size)
+
+
+def scan_shard(file_path: str, start: int, stop: int, margin: int = DEFAULT_MARGIN, out_path: str = None,
+               data_types: list[DATA_TYPE] | None = None, **finder_kwargs) -> str:
+    """
+    Scans the byte range [start - margin, stop + margin) of a file and writes a partial report.
+    The range is widened to the scan windows of a single threaded scan of the whole file,
+    so a shard finds the same streaks as that scan. All offsets in the report are absolute file offsets.
+    """
+    if out_path is None:
+        out_path = result_path(f'{os.path.basename(file_path)}_{start}_{stop}.json')
+
+    finder_kwargs.setdefault('number_of_threads', 1)
+    file_size = os.path.getsize(file_path)
+    window_size = BinaryDataFinder(file_path, **finder_kwargs)._test_chunk_size
+    read_start = max(0, start - margin) // window_size * window_size
+    read_stop = min(file_size, math.ceil((stop + margin) / window_size) * window_size)
+    bdf = ShardFinder(file_path, file_size, offset=read_start, length=read_stop - read_start, **finder_kwargs)
+    bdf.read().find_data(data_types=data_types, resolve_overlaps=False)
+    for res in bdf.results:
+        res.streak = range(res.streak.start + read_start, res.streak.stop + read_start, res.streak.step)
+
+    with open(out_path, 'w') as report:
+        report_obj = {'shard': {'file_path': file_path, 'start': start, 'stop': stop, 'margin': margin,
+                                'file_size': file_size},
+                      'results': [x.__dict__() for x in bdf.results]}
+        report.write(json.dumps(report_obj, indent=4))
+
+    return os.path.abspath(out_path)
+
+
+def merge_reports(report_paths: list[str], out_path: str = None) -> str:
+    """
+    Merges the partial reports. The shards validated their streaks over the whole file already,
+    so only the streaks found by more than one shard and the overlaps are resolved like in a single scan.
+    """
+    if out_path is None:
+        out_path = result_path('report.json')
+
+    results: dict[int, FoundDataInfo] = {}
+    shard = {}
+    for report_path in report_paths:
+        with open(report_path, 'r') as report:
+            shard = json.load(report)['shard']
+        # One streak per offset, like the results of a single scan
+        for res in FoundDataInfo.from_file(report_path):
+            if res.offset not in results or res.quality_index < results[res.offset].quality_index:
+                results[res.offset] = res
+
+    bdf = BinaryDataFinder(shard['file_path'])
+    results = sorted(results.values(), key=lambda a: a.offset)
+    results = bdf._find_overlapping_streaks(results)
+    results = bdf._find_overlapping_streaks(results)
+
+    with open(out_path, 'w') as report:
+        report_obj = {'results': [x.__dict__() for x in results]}
+        report.write(json.dumps(report_obj, indent=4))
+
+    return os.path.abspath(out_path)
+
+
+def run_local(file_path: str, number_of_shards: int, margin: int = DEFAULT_MARGIN, out_path: str = None,
+              data_types: list[DATA_TYPE] | None = None, min_length_data: int = 1000) -> str:
+    """
+    Runs every shard as a separate process on this machine and merges the partial reports.
+    """
+    if out_path is None:
+        out_path = result_path('report.json')
+
+    # The partial reports are only needed for the merge
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(out_path))) as report_dir:
+        report_paths = []
+        processes = []
+        for (start, stop) in shard_ranges(os.path.getsize(file_path), number_of_shards):
+            report_path = os.path.join(report_dir, f'{os.path.basename(file_path)}_{start}_{stop}.json')
+            args = [sys.executable, '-m', 'BinaryDataDecoder.shard', 'scan', file_path, str(start), str(stop),
+                    '--margin', str(margin), '--min-length-data', str(min_length_data), '--out', report_path]
+            if data_types is not None:
+                args += ['--data-types'] + [d.name for d in data_types]
+            processes.append(subprocess.Popen(args, stdout=subprocess.DEVNULL))
+            report_paths.append(report_path)
+
+        for process in processes:
+            if process.wait() != 0:
+                raise RuntimeError(f'Shard scan failed: {process.args}')
+
+        return merge_reports(report_paths, out_path)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog='BinaryDataDecoder.shard',
+                                     description='Scans a binary file in independent shards and merges the reports')
+    sub_parsers = parser.add_subparsers(dest='command', required=True)
+
+    scan_parser = sub_parsers.add_parser('scan', help='Scan one byte range of a file')
+    scan_parser.add_argument('file_path')
+    scan_parser.add_argument('start', type=int)
+    scan_parser.add_argument('stop', type=int)
+    scan_parser.add_argument('--margin', type=int, default=DEFAULT_MARGIN)
+    scan_parser.add_argument('--out', default=None)
+
+    merge_parser = sub_parsers.add_parser('merge', help='Merge partial shard reports')
+    merge_parser.add_argument('reports', nargs='+')
+    merge_parser.add_argument('--out', default=None)
+
+    local_parser = sub_parsers.add_parser('local', help='Scan all shards as local processes and merge them')
+    local_parser.add_argument('file_path')
+    local_parser.add_argument('number_of_shards', type=int)
+    local_parser.add_argument('--margin', type=int, default=DEFAULT_MARGIN)
+    local_parser.add_argument('--out', default=None)
+
+    for p in (scan_parser, local_parser):
+        p.add_argument('--min-length-data', type=int, default=1000)
+        p.add_argument('--data-types', nargs='+', choices=[d.name for d in DATA_TYPE], default=None)
+
+    args = parser.parse_args(argv)
+    if args.command == 'merge':
+        print(merge_reports(args.reports, args.out))
+        return
+
+    data_types = None if args.data_types is None else [DATA_TYPE[d] for d in args.data_types]
+    if args.command == 'scan':
+        print(scan_shard(args.file_path, args.start, args.stop, args.margin, args.out, data_types=data_types,
+                         min_length_data=args.min_length_data))
+    else:
+        print(run_local(args.file_path, args.number_of_shards, args.margin, args.out, data_types=data_types,
+                        min_length_data=args.min_length_data))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+import json
+from typing import Self
+
+from BinaryDataDecoder.data_finder import BinaryDataFinder
+from BinaryDataDecoder.helper import FoundDataInfo, DATA_TYPE, ENDIAN, DataTypeMetaData
+
+
+class TemplateEntry:
+    def __init__(self, data_type: DATA_TYPE, endian: ENDIAN, bytes_step: int, offset: int, number_of_values: int):
+        """
+        :param offset: Offset of the streak relative to the anchor of the template
+        """
+        self.data_type = data_type
+        self.endian = endian
+        self.bytes_step = bytes_step
+        self.offset = offset
+        self.number_of_values = number_of_values
+
+    def __dict__(self):
+        return {
+            'formatter_char': self.data_type.value[1],
+            'endian': self.endian.value,
+            'bytes_step': self.bytes_step,
+            'offset': self.offset,
+            'number_of_values': self.number_of_values,
+        }
+
+
+class LayoutTemplate:
+    """
+    Streak layout of a finished scan. Files written by the same instrument format
+    can be checked against the template instead of being searched.
+    The streaks are stored relative to an anchor, the start of the first streak. The anchor is found once
+    in another file by the signature in front of it, all streaks are shifted by the same distance.
+    """
+    # Distance around the template anchor in which the signature is searched
+    SIGNATURE_SEARCH_RANGE = 4096
+
+    @classmethod
+    def from_results(cls, bdf: BinaryDataFinder, signature_length: int = 0) -> Self:
+        """
+        :param bdf: Finder with the results of a finished scan
+        :param signature_length: Number of bytes in front of the first streak used to anchor the template
+                                 in other files, e.g. the end of a file header
+        """
+        if len(bdf.results) == 0:
+            return cls([])
+        anchor = min(res.offset for res in bdf.results)
+        signature = b''
+        if 0 < signature_length <= anchor:
+            signature = bdf.content[anchor - signature_length:anchor]
+        entries = [TemplateEntry(DATA_TYPE.get_from_char(res.data_type.formatter_char), res.endian, res.bytes_step,
+                                 res.offset - anchor, len(res.streak)) for res in bdf.results]
+        return cls(entries, anchor, signature)
+
+    @classmethod
+    def from_file(cls, fp: str) -> Self:
+        with open(fp, 'r') as f:
+            json_data = json.load(f)
+
+        entries = []
+        for x in json_data['entries']:
+            endian = ENDIAN.LITTLE_ENDIAN if x['endian'] == 'little' else ENDIAN.BIG_ENDIAN
+            entries.append(TemplateEntry(DATA_TYPE.get_from_char(x['formatter_char']), endian, x['bytes_step'],
+                                         x['offset'], x['number_of_values']))
+        return cls(entries, json_data['anchor'], bytes.fromhex(json_data['signature']))
+
+    def __init__(self, entries: list[TemplateEntry], anchor: int = 0, signature: bytes = b'',
+                 min_coverage: float = 0.5):
+        """
+        :param anchor: Offset of the anchor in the file the template was made from
+        :param signature: Bytes in front of the anchor, an empty signature anchors the template at the same offset
+        """
+        self.entries = entries
+        self.anchor = anchor
+        self.signature = signature
+        self.min_coverage = min_coverage
+
+    def write_to_file(self, out_path: str) -> str:
+        with open(out_path, 'w') as template:
+            template.write(json.dumps({'anchor': self.anchor, 'signature': self.signature.hex(),
+                                       'entries': [x.__dict__() for x in self.entries]}, indent=4))
+        return out_path
+
+    def apply(self, bdf: BinaryDataFinder) -> list[FoundDataInfo] | None:
+        """
+        Verifies and extends every streak of the template in the file of bdf.
+        Returns None if the anchor is not found or as soon as one streak can not be verified.
+        """
+        content = bdf.content
+        anchor = self._find_anchor(content)
+        if anchor is None:
+            return None
+
+        results = []
+        for entry in self.entries:
+            data_type = entry.data_type.data_type_meta_data()
+            if bdf.decrease_accuracy:
+                data_type.decrease_accuracy()
+            offset = anchor + entry.offset
+            if not self._starts_streak(bdf, content, offset, entry, data_type):
+                return None
+
+            finding = FoundDataInfo(offset, entry.bytes_step, data_type, entry.endian, 0)
+            bdf._validate_whole_streak(finding)
+            if (finding.quality_index >= bdf.MAX_VALIDATION_ERROR or
+                    len(finding.streak) < entry.number_of_values * self.min_coverage):
+                return None
+            results.append(finding)
+
+        results.sort(key=lambda a: a.offset)
+        return results
+
+    def find_data(self, bdf: BinaryDataFinder, **find_data_kwargs) -> BinaryDataFinder:
+        """
+        Uses the template for the results of bdf and falls back to the full search if it does not match.
+        """
+        results = self.apply(bdf)
+        if results is None:
+            return bdf.find_data(**find_data_kwargs)
+        bdf.results = results
+        return bdf
+
+    def _find_anchor(self, content: bytes) -> int | None:
+        if len(self.signature) == 0:
+            return self.anchor if self.anchor < len(content) else None
+
+        expected = self.anchor - len(self.signature)
+        start = max(0, expected - self.SIGNATURE_SEARCH_RANGE)
+        stop = expected + self.SIGNATURE_SEARCH_RANGE + len(self.signature)
+        best = None
+        idx = content.find(self.signature, start, stop)
+        while idx != -1:
+            if best is None or abs(idx - expected) < abs(best - expected):
+                best = idx
+            idx = content.find(self.signature, idx + 1, stop)
+        return None if best is None else best + len(self.signature)
+
+    @staticmethod
+    def _starts_streak(bdf: BinaryDataFinder, content: bytes, offset: int, entry: TemplateEntry,
+                       data_type: DataTypeMetaData) -> bool:
+        stride = entry.bytes_step + data_type.length_in_byte
+        words = [content[offset + i * stride:offset + i * stride + data_type.length_in_byte] for i in range(3)]
+        if offset < 0 or len(words[-1]) < data_type.length_in_byte:
+            return False
+        parser = dict((endian, parser) for (parser, endian) in data_type.endian_bitmasks)[entry.endian]
+        return bdf._step_check(words, parser)
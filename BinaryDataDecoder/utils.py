@@ -14,9 +14,10 @@ def find_unused_2byte_pair(data: bytes) -> bytes | None:
     return None  # This should never happen unless all pairs are used
 
 
-def open_as_binary(filename: str, offset: int = 0) -> bytes:
+def open_as_binary(filename: str, offset: int = 0, length: int = -1) -> bytes:
     with open(filename, 'rb') as f:
-        return b''.join(f.readlines())[offset:]
+        f.seek(offset)
+        return f.read(length)
 
 
 def open_as_binary_lines(filename: str, offset: int = 0, n_bytes: int = 8, n_parts: int = -1) -> list[bytes]:
@@ -34,7 +35,12 @@ def bytes_as_binary_lines(lines: bytes, n_bytes: int = 8, n_parts: int = -1):
 
 
 RESULT_DIR = os.path.join(f'binary_data_decoder')
-os.makedirs(RESULT_DIR, exist_ok=True)
+
+
+def result_path(file_name: str) -> str:
+    os.makedirs(RESULT_DIR, exist_ok=True)
+    return os.path.join(RESULT_DIR, file_name)
+
 
 def lines_replace_read(lines: list[bytes], to_remove: list[tuple[int, int, int, int]],
                         replacement: bytes) -> bytes:
@@ -1,4 +1,5 @@
 import os
+import random
 import struct
 
 double_v = [(x - 25) * 0.1 for x in range(10, 500)]
@@ -62,3 +63,12 @@ if __name__ == "__main__":
         douple_douple_int_v.append(int_v[i])
 
     write_data_bin(douple_douple_int_v, 'ddi' * len(int_v), 'ddi')
+
+    # Wide records: a double followed by 112 bytes of noise
+    noise = random.Random(0)
+    wide_record_v = []
+    for value in double_v:
+        wide_record_v.append(value)
+        wide_record_v.append(noise.randbytes(112))
+
+    write_data_bin(wide_record_v, 'd112s' * len(double_v), 'wide')
@@ -1,11 +1,19 @@
 import json
 import os
+import random
+import struct
+import threading
+import urllib.error
+import urllib.request
 
 import pytest
 
 from BinaryDataDecoder.data_finder import BinaryDataFinder
 from BinaryDataDecoder.extract_data import DataExtractor
 from BinaryDataDecoder.helper import FoundDataInfo, DATA_TYPE, ENDIAN
+from BinaryDataDecoder.server import DecodeServer
+from BinaryDataDecoder.shard import run_local
+from BinaryDataDecoder.template import LayoutTemplate
 from tests.prepare_test_data import double_v, double_expo_v, double_sqrt_v, short_v, int_v
 
 BIN_PATH = os.path.join(os.path.dirname(__file__), "..", "test_files", "MSPeak.bin")
@@ -115,3 +123,216 @@ def test_ddi():
     assert list(res[0].values) == double_v
     assert list(res[1].values) == double_expo_v
     assert list(res[2].values) == int_v
+
+
+def test_ddi_top_k():
+    bdf = BinaryDataFinder(DDI_BIN_PATH, min_length_data=200, number_of_threads=2).read().find_data(data_types=[DATA_TYPE.DOUBLE, DATA_TYPE.INT], top_k=2)
+    res = bdf.results
+    assert len(res) == 2
+    assert res[0].streak == range(0, 9800, 20)
+    assert res[1].streak == range(8, 9800, 20)
+
+    # A streak found again in later windows and streaks overlapping a better one do not fill the top_k
+    res = BinaryDataFinder(DDI_BIN_PATH, min_length_data=200, number_of_threads=2).read().find_data(top_k=3).results
+    assert [r.streak for r in res] == [range(0, 9800, 20), range(8, 9800, 20), range(16, 9800, 20)]
+
+
+def test_regions(tmp_path):
+    regions = [(2000, 4000), (6000, 8000)]
+    bdf = BinaryDataFinder(DDI_BIN_PATH, min_length_data=200, number_of_threads=2, regions=regions).read().find_data(data_types=[DATA_TYPE.DOUBLE])
+    res = bdf.results
+    assert len(res) == 4
+    assert res[0].streak == range(2000, 4000, 20)
+    assert res[3].streak == range(6008, 8000, 20)
+    DataExtractor(bdf).extract_values()
+    assert list(res[0].values) == double_v[100:200]
+    assert list(res[3].values) == double_expo_v[300:400]
+
+    # Only the ints between the doubles of both regions are left
+    with open(DataExtractor(bdf).write_bin_leftovers(str(tmp_path / "leftovers.bin")), "rb") as f:
+        assert f.read() == struct.pack("<200i", *int_v[100:200], *int_v[300:400])
+
+    # Regions are clamped to the file, a region behind its end is skipped
+    regions = [(6000, 12000), (9900, 12000)]
+    bdf = BinaryDataFinder(DDI_BIN_PATH, min_length_data=200, number_of_threads=2, regions=regions).read().find_data(data_types=[DATA_TYPE.DOUBLE])
+    assert [r.streak for r in bdf.results] == [range(6000, 9800, 20), range(6008, 9800, 20)]
+    for region in ((4000, 2000), (4000, 4000), (4000, 3999)):
+        with pytest.raises(ValueError):
+            BinaryDataFinder(DDI_BIN_PATH, regions=[region])
+
+
+def test_prefilter(tmp_path):
+    bdf = BinaryDataFinder(DDI_BIN_PATH)
+    chunk = struct.pack('<10d', *[float('nan')] * 10)
+    plausible = bdf._prefilter(chunk, DATA_TYPE.DOUBLE.data_type_meta_data(), [0, 8], 1)
+    assert not plausible[0].any()
+    assert bdf.prefilter_counts['nan_inf'] == 2
+
+    chunk = struct.pack('<10i', *int_v[:10])
+    plausible = bdf._prefilter(chunk, DATA_TYPE.INT.data_type_meta_data(), [0], 1)
+    assert plausible[0, 0, 0]
+
+    # Signed values crossing zero are sign extended, an unsigned series wrapping over 32767 is not
+    bdf = BinaryDataFinder(DDI_BIN_PATH)
+    chunk = struct.pack('<5h', -600, -300, 0, 300, 600)
+    bdf._prefilter(chunk, DATA_TYPE.SHORT.data_type_meta_data(), [0], 1)
+    assert bdf.prefilter_counts['sign_extension'] == 0
+    chunk = struct.pack('<5H', 32000, 32300, 32600, 32900, 33200)
+    assert bdf._prefilter(chunk, DATA_TYPE.U_SHORT.data_type_meta_data(), [0], 1)[0, 0, 0]
+    assert not bdf._prefilter(chunk, DATA_TYPE.SHORT.data_type_meta_data(), [0], 1)[0, 0, 0]
+    # Read as big endian, the values wrap as well
+    assert bdf.prefilter_counts['sign_extension'] == 2
+
+    # An exponent jump by 11, which the step check accepts with decrease_accuracy
+    data_type = DATA_TYPE.DOUBLE.data_type_meta_data()
+    data_type.decrease_accuracy()
+    chunk = struct.pack('<5d', *[2.0 ** e for e in (1, 12, 20, 28, 36)])
+    assert bdf._step_check(bdf._split_bytes(chunk, 8, 0)[:5], data_type.endian_bitmasks[0][0])
+    assert bdf._prefilter(chunk, data_type, [0], 1)[0, 0, 0]
+
+    # Steep series whose high bytes step by up to 2, with and without crossing zero
+    file_path = str(tmp_path / "h.bin")
+    for start, streaks in ((0, [range(0, 200, 2)]), (-15000, [range(0, 100, 2), range(100, 200, 2)])):
+        with open(file_path, "wb") as f:
+            f.write(struct.pack('<100h', *[start + i * 300 for i in range(100)]))
+        bdf = BinaryDataFinder(file_path, min_length_data=20, number_of_threads=1).read().find_data(data_types=[DATA_TYPE.SHORT])
+        assert [r.streak for r in bdf.results] == streaks
+
+
+def test_wide_records():
+    file_path = os.path.join(os.path.dirname(__file__), "..", "test_files", "wide.bin")
+    bdf = BinaryDataFinder(file_path, min_length_data=200, number_of_threads=2).read().find_data(data_types=[DATA_TYPE.DOUBLE])
+    res = bdf.results
+    assert len(res) == 1
+    assert res[0].streak == range(0, 58800, 120)
+    DataExtractor(bdf).extract_values()
+    assert list(res[0].values) == double_v
+
+    with open(file_path, "rb") as f:
+        assert BinaryDataFinder._detect_periods(f.read()[7000:7500], 26) == [120]
+    assert BinaryDataFinder._detect_periods(random.Random(0).randbytes(500), 26) == []
+
+
+def test_read_partitioning():
+    file_path = os.path.join(os.path.dirname(__file__), "..", "test_files", "d.bin")
+    bdf = BinaryDataFinder(file_path, min_length_data=200, number_of_threads=10).read()
+    assert len(bdf.bin_file_contents) == 3
+    assert sum(len(c) for c in bdf.bin_file_contents) == os.path.getsize(file_path)
+    # Streaks are extended over the partition borders, in blocks of values
+    bdf.STREAK_BLOCK_SIZE = 16
+    finding = FoundDataInfo(1600, 0, DATA_TYPE.DOUBLE.data_type_meta_data(), ENDIAN.LITTLE_ENDIAN, 0)
+    assert bdf._move_to_next_vals_in_streak(finding, backward=True) == 0
+    assert bdf._move_to_next_vals_in_streak(finding) == 3920
+
+    bdf = BinaryDataFinder(file_path, min_length_data=200, number_of_threads=BinaryDataFinder.AUTO_THREADS).read()
+    assert 1 <= len(bdf.bin_file_contents) <= min(os.cpu_count(), 3)
+    assert len(bdf.bin_file_contents[0]) >= bdf._test_chunk_size
+
+
+def test_streak_validation_errors():
+    bdf = BinaryDataFinder(DDI_BIN_PATH, min_length_data=200, number_of_threads=2).read()
+    data_type = DATA_TYPE.DOUBLE.data_type_meta_data()
+    values = bdf.values_at(range(8, 9808, 20), ENDIAN.LITTLE_ENDIAN, data_type)
+    assert list(values) == double_expo_v
+
+    errors = bdf._streak_validation_errors(values[:30])
+    windows = [values[:4]] + [values[i:i + 5] for i in range(3, 26, 3)]
+    assert len(errors) == len(windows)
+    for error, window in zip(errors, windows):
+        expected = bdf._validate_result(window.tobytes(), ENDIAN.LITTLE_ENDIAN, data_type)
+        assert error == pytest.approx(expected)
+
+
+def test_sharded_scan(tmp_path):
+    for number_of_shards in (2, 3):
+        out_path = run_local(DDI_BIN_PATH, number_of_shards, min_length_data=200,
+                             data_types=[DATA_TYPE.DOUBLE, DATA_TYPE.INT], out_path=str(tmp_path / "report.json"))
+        res = FoundDataInfo.from_file(out_path)
+        assert len(res) == 3
+        assert res[0].streak == range(0, 9800, 20)
+        assert res[1].streak == range(8, 9800, 20)
+        assert res[2].streak == range(16, 9800, 20)
+        assert [r.quality_index for r in res] == [-80.0, -80.0, 100.0]
+        assert os.listdir(tmp_path) == ["report.json"]
+
+    # Two series of the same type meet at 3920, they are not joined across the shard boundaries
+    follow_d_path = os.path.join(os.path.dirname(__file__), "..", "test_files", "follow_d.bin")
+    single = BinaryDataFinder(follow_d_path, min_length_data=200, number_of_threads=1).read().find_data().results
+    assert [r.streak for r in single if r.data_type.formatter_char == 'd' and r.streak.step == 8] == [
+        range(0, 3920, 8), range(3920, 7840, 8)]
+    for number_of_shards in (2, 3, 4):
+        res = FoundDataInfo.from_file(run_local(follow_d_path, number_of_shards, min_length_data=200,
+                                                out_path=str(tmp_path / "report.json")))
+        assert [str(r) for r in res] == [str(r) for r in single]
+
+
+def test_decode_server():
+    with pytest.raises(ValueError):
+        DecodeServer(("0.0.0.0", 0), number_of_workers=1)
+    server = DecodeServer(("127.0.0.1", 0), number_of_workers=1)
+    # The worker is started before the first request
+    assert len(server._pool._processes) == 1
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def post(command, request):
+        req = urllib.request.Request(f"http://127.0.0.1:{server.server_port}/{command}", data=json.dumps(request).encode())
+        try:
+            with urllib.request.urlopen(req) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return {"status": e.code}
+
+    try:
+        request = {"file_path": DDI_BIN_PATH, "min_length_data": 200, "number_of_threads": 2, "data_types": ["DOUBLE"]}
+        res = post("scan", request)["results"]
+        assert [r["streak"][:2] for r in res] == [[0, 9800], [8, 9800]]
+        assert post("scan", request) == {"results": res}
+
+        res = post("extract", request)["results"]
+        assert res[0]["values"] == double_v
+        assert res[1]["values"] == double_expo_v
+        # Misses the answer cache but uses the cached finder of the extract request
+        res = post("scan", {**request, "n_bytes": 16})["results"]
+        assert [r["values"] for r in res] == [[], []]
+        assert post("scan", {**request, "number_of_threads": "x"}) == {"status": 400}
+
+        lines = post("hexdump", {"file_path": DDI_BIN_PATH, "length": 32})["lines"]
+        assert len(lines) == 2
+        assert lines[1].startswith("00000010 ")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_layout_template(tmp_path):
+    bdf = BinaryDataFinder(DDI_BIN_PATH, min_length_data=200, number_of_threads=2).read().find_data(data_types=[DATA_TYPE.DOUBLE, DATA_TYPE.INT])
+    template_path = LayoutTemplate.from_results(bdf, signature_length=4).write_to_file(str(tmp_path / "template.json"))
+    template = LayoutTemplate.from_file(template_path)
+
+    res = template.apply(BinaryDataFinder(DDI_BIN_PATH, min_length_data=200))
+    assert [r.streak for r in res] == [range(0, 9800, 20), range(8, 9800, 20), range(16, 9800, 20)]
+
+    file_path = os.path.join(os.path.dirname(__file__), "..", "test_files", "d.bin")
+    bdf = BinaryDataFinder(file_path, min_length_data=200, number_of_threads=2)
+    assert template.apply(bdf) is None
+    res = template.find_data(bdf).results
+    assert len(res) == 1
+    assert res[0].streak == range(0, 3920, 8)
+
+    # Same format with a longer header and other values, the template is anchored at the end of the header
+    def write_file(name, header_size, scale):
+        header = struct.pack('<II', header_size, scale) + bytes(header_size - 16) + b'DATAMARK'
+        first = struct.pack('<300d', *[scale * (10 + 0.5 * i) for i in range(300)])
+        second = struct.pack('<300d', *[scale * (1000 - 0.01 * i * i) for i in range(300)])
+        file_path = str(tmp_path / name)
+        with open(file_path, 'wb') as f:
+            f.write(header + first + b'\xff' * 16 + second)
+        return file_path
+
+    bdf = BinaryDataFinder(write_file("a.bin", 32, 1), min_length_data=200, number_of_threads=1).read().find_data(
+        data_types=[DATA_TYPE.DOUBLE])
+    assert [r.streak for r in bdf.results] == [range(32, 2432, 8), range(2448, 4848, 8)]
+    template = LayoutTemplate.from_file(LayoutTemplate.from_results(bdf, signature_length=8).write_to_file(
+        str(tmp_path / "template.json")))
+    res = template.apply(BinaryDataFinder(write_file("b.bin", 40, 7), min_length_data=200))
+    assert [r.streak for r in res] == [range(40, 2440, 8), range(2456, 4856, 8)]